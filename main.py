@@ -1,94 +1,416 @@
-import json
-from datetime import datetime
-from typing import Optional, List, Dict, Any, Union
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import asynccontextmanager
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, Union, AsyncIterator, Tuple
 
-import requests
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form, Body
-from pydantic import BaseModel
+import httpx
+import orjson
+import redis.asyncio as redis
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form, Body, Request
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, Field
 
-app = FastAPI()
-
-# Base URL for ragie.ai API endpoints (adjust if necessary)
+# Base URL for ragie.ai API endpoints (adjust if necessary); set once on the
+# shared client so calls only pass the path
 BASE_URL = "https://api.ragie.ai"
 
+# Logger for upstream call diagnostics; per-request timings and sizes are only
+# formatted when LOG_LEVEL is DEBUG. It gets its own handler because uvicorn
+# only configures its uvicorn.* loggers, and the lastResort fallback would
+# drop everything below WARNING.
+logger = logging.getLogger("ragie")
+if not logger.handlers:
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s - %(message)s"))
+    logger.addHandler(log_handler)
+logger.propagate = False
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+if isinstance(logging.getLevelName(LOG_LEVEL), int):
+    logger.setLevel(LOG_LEVEL)
+else:
+    logger.setLevel(logging.INFO)
+    logger.warning("Unknown LOG_LEVEL %r, falling back to INFO", LOG_LEVEL)
+
+# Ragie API token, read once at import so the header below is built only once
+RAGIE_TOKEN = os.environ["RAGIE_TOKEN"]
+AUTH = f"Bearer {RAGIE_TOKEN}"
+
+# Base headers sent with every call to ragie.ai. Built once and frozen; they are
+# attached to the shared client so individual requests never rebuild them.
+DEFAULT_HEADERS = MappingProxyType({
+    "accept": "application/json",
+    "authorization": AUTH
+})
+
+# Content-Type for GET/DELETE requests (JSON POSTs get it from httpx's json=)
+JSON_CONTENT_TYPE = MappingProxyType({"Content-Type": "application/json"})
+
+# Max number of in-flight requests to ragie.ai per worker; extra calls wait
+# for a slot instead of bursting past Ragie's rate limits
+UPSTREAM_SEMAPHORE = asyncio.Semaphore(32)
+
+# Retry policy for rate-limited or failing upstream calls
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+UPSTREAM_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 10.0
+
+# Max bytes of a non-JSON upstream error body echoed back to the caller
+ERROR_BODY_LIMIT = 2048
+
+# Allowed shape for organization/knowledge base ids. Enforced everywhere an id
+# enters the API so ingested ids can always be listed, and so ids never carry
+# glob characters into the Redis SCAN patterns used for cache invalidation
+ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+# Metadata filter JSON for the two fixed listing shapes, so a filter is built
+# by substituting the (JSON-encoded) ids rather than encoding a fresh dict
+ORG_FILTER_TEMPLATE = '{{"organization_id":{{"$eq":{org}}}}}'
+ORG_KB_FILTER_TEMPLATE = '{{"$and":[{{"organization_id":{{"$eq":{org}}}}},{{"knowledgeBase_id":{{"$eq":{kb}}}}}]}}'
+
+# HTML5 form-data escaping for header parameters such as the upload filename
+# (same table httpx uses): quotes, backslashes and control characters, so a
+# crafted filename can't inject headers into the multipart part
+FORM_PARAM_REPLACEMENTS = {'"': "%22", "\\": "\\\\"}
+FORM_PARAM_REPLACEMENTS.update({chr(c): f"%{c:02X}" for c in range(0x20) if c != 0x1B})
+FORM_PARAM_PATTERN = re.compile("|".join(re.escape(c) for c in FORM_PARAM_REPLACEMENTS))
+
+# Size of the chunks read from an uploaded file while streaming it to ragie.ai
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Redis instance used to cache /query results
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# How long (in seconds) a cached /query result stays valid
+QUERY_CACHE_TTL = 300
+
+# /query requests currently being fetched from Ragie in this worker, keyed by
+# query cache key; identical concurrent queries await the same future
+INFLIGHT_QUERIES: Dict[str, asyncio.Future] = {}
+
+# How long (in seconds) a cached /knowledge-bases listing stays valid
+KB_LIST_CACHE_TTL = 60
+
+# Largest page Ragie's /documents listing returns, used when walking every page
+DOCUMENT_PAGE_SIZE = 100
+
+# How long (in seconds) a cached /documents listing stays valid
+DOCUMENT_LIST_CACHE_TTL = 30
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create one shared async HTTP client per worker so upstream calls reuse
+    pooled keep-alive connections, plus the Redis cache connection, and close
+    both on shutdown.
+    """
+    app.state.redis = redis.Redis.from_url(REDIS_URL)
+    app.state.client = httpx.AsyncClient(
+        base_url=BASE_URL,
+        timeout=30,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        headers=DEFAULT_HEADERS
+    )
+    try:
+        yield
+    finally:
+        await app.state.client.aclose()
+        await app.state.redis.aclose()
+
+
+# ORJSONResponse so responses to our own clients are encoded with orjson too
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
 
 # --------------------------
 # Utility Function
 # --------------------------
-def get_api_response(url: str, params: Optional[dict] = None, method: str = "GET", payload: Optional[dict] = None, file: Optional[dict] = None) -> dict:
+def retry_delay(response: httpx.Response, attempt: int) -> float:
     """
-    Helper function to perform API calls and return the JSON response.
+    Seconds to wait before retrying: the server's Retry-After when it gives one
+    in seconds, otherwise exponential backoff.
+    """
+    retry_after = response.headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            return min(max(float(retry_after), 0.0), RETRY_MAX_DELAY)
+        except ValueError:
+            pass  # HTTP-date form; fall back to backoff
+    return min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY)
+
+
+async def send_with_retries(client: httpx.AsyncClient, method: str, path: str, retry: bool = True, **kwargs) -> httpx.Response:
+    """
+    Send a request while holding an upstream concurrency slot, retrying
+    429/5xx responses with backoff. Raises httpx.HTTPStatusError when the
+    final attempt still fails.
+    """
+    attempts = UPSTREAM_MAX_ATTEMPTS if retry else 1
+    for attempt in range(attempts):
+        async with UPSTREAM_SEMAPHORE:
+            response = await client.request(method, path, **kwargs)
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt == attempts - 1:
+            response.raise_for_status()
+            return response
+        # Back off outside the semaphore so waiting retries don't hold a slot
+        delay = retry_delay(response, attempt)
+        logger.warning("API Request to %s (%s) got %d, retrying in %.2f seconds", path, method, response.status_code, delay)
+        await asyncio.sleep(delay)
+
+
+async def fetch_api_response(client: httpx.AsyncClient, path: str, params: Optional[dict] = None, method: str = "GET", payload: Optional[dict] = None, content: Optional[AsyncIterator[bytes]] = None, headers: Optional[dict] = None) -> httpx.Response:
+    """
+    Helper function to perform API calls and return the raw successful response.
+    Upstream failures are raised as HTTPException.
     """
-    # Base headers without Content-Type (will be set appropriately based on request type)
-    headers = {
-        "accept": "application/json",
-        "authorization": f"Bearer tnt_IaYFVQkh7fq_ZiEfWDZE76FMAWw4AKooJ88kbjs9igKHlY1GiG63kUU"
-    }
-    
     # Start timing the request
-    start_time = datetime.now()
+    start_time = time.perf_counter()
     
     try:
         if method.upper() == "GET":
-            # For GET requests, add Content-Type header
-            get_headers = headers.copy()
-            get_headers["Content-Type"] = "application/json"
-            response = requests.get(url, headers=get_headers, params=params)
+            response = await send_with_retries(client, "GET", path, headers=JSON_CONTENT_TYPE, params=params)
         elif method.upper() == "POST":
-            if file:
-                # For file uploads, don't set Content-Type - let requests handle it
-                # Let requests handle multipart/form-data encoding
-                response = requests.post(url, headers=headers, data=payload, files=file)
+            if content is not None:
+                # For file uploads, the body is a pre-encoded multipart stream
+                # and headers carries its Content-Type (and Content-Length if known).
+                # The stream can only be consumed once, so uploads are not retried.
+                response = await send_with_retries(client, "POST", path, retry=False, content=content, headers=headers)
             else:
-                # For regular JSON POST requests
-                json_headers = headers.copy()
-                json_headers["Content-Type"] = "application/json"
-                response = requests.post(url, headers=json_headers, json=payload)
+                # For regular JSON POST requests (httpx sets the JSON Content-Type)
+                response = await send_with_retries(client, "POST", path, json=payload)
         elif method.upper() == "DELETE":
-            # For DELETE requests
-            delete_headers = headers.copy()
-            delete_headers["Content-Type"] = "application/json"
-            response = requests.delete(url, headers=delete_headers)
+            # Not retried: a delete that committed before a 502/504 would retry
+            # into a 404 and report a successful delete as a failure
+            response = await send_with_retries(client, "DELETE", path, retry=False, headers=JSON_CONTENT_TYPE)
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
         
         # Calculate elapsed time
-        elapsed_time = (datetime.now() - start_time).total_seconds()
-        print(f"API Request to {url} ({method}) completed in {elapsed_time:.3f} seconds")
-            
-        response.raise_for_status()
+        elapsed_time = time.perf_counter() - start_time
+        logger.debug("API Request to %s (%s) completed in %.3f seconds", path, method, elapsed_time)
         
-        # Handle empty responses (like from DELETE operations)
-        if response.text.strip():
-            result = response.json()
-            # Log response size for debugging
-            print(f"Response size: {len(str(result))} characters")
-            return result
-        return {}
+        # Log response size for debugging
+        logger.debug("Response size: %d bytes", len(response.content))
+        return response
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         # Calculate elapsed time on error too
-        elapsed_time = (datetime.now() - start_time).total_seconds()
-        print(f"API Request to {url} ({method}) FAILED after {elapsed_time:.3f} seconds")
+        elapsed_time = time.perf_counter() - start_time
+        logger.warning("API Request to %s (%s) FAILED after %.3f seconds", path, method, elapsed_time)
         
         # Better error handling to see exactly what's going wrong
+        # (only HTTPStatusError carries a response; transport errors do not)
         error_detail = str(e)
-        if hasattr(e, 'response') and e.response:
+        error_response = getattr(e, 'response', None)
+        if error_response is not None:
             try:
-                error_detail = e.response.json()
-            except:
-                error_detail = e.response.text
+                error_detail = orjson.loads(error_response.content)
+            except ValueError:
+                # Non-JSON error bodies can be large (e.g. HTML pages); keep a bounded prefix
+                error_detail = error_response.content[:ERROR_BODY_LIMIT].decode(errors="replace")
+        # Pass the upstream detail through as-is so FastAPI encodes it once
         raise HTTPException(
-            status_code=e.response.status_code if hasattr(e, 'response') else 500,
-            detail=f"Error from Ragie API: {error_detail}"
+            status_code=error_response.status_code if error_response is not None else 500,
+            detail={"message": "Error from Ragie API", "upstream": error_detail}
         )
 
 
+async def get_api_response(client: httpx.AsyncClient, path: str, **kwargs) -> dict:
+    """
+    Helper function to perform API calls and return the JSON response.
+    Accepts the same keyword arguments as fetch_api_response.
+    """
+    response = await fetch_api_response(client, path, **kwargs)
+    
+    # Handle empty responses (like from DELETE operations)
+    if response.content.strip():
+        return orjson.loads(response.content)
+    return {}
+
+
+async def list_all_documents(client: httpx.AsyncClient, params: dict) -> List[dict]:
+    """
+    Fetch every page of a /documents listing by following Ragie's
+    pagination.next_cursor. Pages are cursor-chained, so they are fetched in order.
+    """
+    params = {**params, "page_size": DOCUMENT_PAGE_SIZE}
+    documents = []
+    while True:
+        response = await get_api_response(client, "/documents", params=params, method="GET")
+        documents.extend(response.get("documents", []) if response else [])
+        next_cursor = ((response or {}).get("pagination") or {}).get("next_cursor")
+        if not next_cursor:
+            return documents
+        params["cursor"] = next_cursor
+
+
+def build_metadata_filter(organization_id: str, knowledgeBase_id: Optional[str] = None) -> str:
+    """
+    Build the metadata filter string for a document listing. Filters on
+    organization_id, and also on knowledgeBase_id (combined with $and) when given.
+    """
+    org = orjson.dumps(organization_id).decode()
+    if knowledgeBase_id:
+        return ORG_KB_FILTER_TEMPLATE.format(org=org, kb=orjson.dumps(knowledgeBase_id).decode())
+    return ORG_FILTER_TEMPLATE.format(org=org)
+
+
+def encode_multipart_upload(fields: Dict[str, str], file: UploadFile) -> Tuple[AsyncIterator[bytes], dict]:
+    """
+    Encode form fields plus an uploaded file as a multipart/form-data body that
+    is streamed chunk by chunk. UploadFile.read() runs off the event loop once
+    the upload has spilled to disk, so large PDFs neither block the loop nor
+    get buffered in memory. Returns the body stream and its request headers.
+    """
+    boundary = uuid.uuid4().hex
+    filename = FORM_PARAM_PATTERN.sub(lambda match: FORM_PARAM_REPLACEMENTS[match.group(0)], file.filename or "upload")
+    content_type = file.content_type or "application/octet-stream"
+
+    preamble = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode()
+        + value.encode() + b"\r\n"
+        for name, value in fields.items()
+    )
+    preamble += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    epilogue = f"\r\n--{boundary}--\r\n".encode()
+
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    # Without a known size httpx falls back to chunked transfer encoding
+    if file.size is not None:
+        headers["Content-Length"] = str(len(preamble) + file.size + len(epilogue))
+
+    async def body() -> AsyncIterator[bytes]:
+        yield preamble
+        await file.seek(0)
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
+        yield epilogue
+
+    return body(), headers
+
+
+# --------------------------
+# Cache Helpers
+# --------------------------
+def query_cache_key(knowledgeBase_id: str, query: str) -> str:
+    """
+    Build the Redis key for a cached /query result.
+    """
+    query_hash = hashlib.sha1(query.encode()).hexdigest()
+    return f"ragie:q:{knowledgeBase_id}:{query_hash}"
+
+
+def kb_list_cache_key(organization_id: str) -> str:
+    """
+    Build the Redis key for an organization's cached knowledge base list.
+    """
+    return f"ragie:kbs:{organization_id}"
+
+
+def document_list_cache_key(organization_id: str, knowledgeBase_id: Optional[str] = None) -> str:
+    """
+    Build the Redis key for a cached /documents listing.
+    """
+    return f"ragie:docs:{organization_id}:{knowledgeBase_id or ''}"
+
+
+async def delete_cache_keys(pattern: str) -> None:
+    """
+    Delete every Redis key matching the given glob pattern.
+    """
+    try:
+        # SCAN instead of KEYS so a large keyspace doesn't block Redis
+        keys = [key async for key in app.state.redis.scan_iter(match=pattern)]
+        if keys:
+            await app.state.redis.delete(*keys)
+    except redis.RedisError as e:
+        logger.warning("Failed to invalidate cache (%s): %s", pattern, e)
+
+
+async def invalidate_query_cache(knowledgeBase_id: Optional[str] = None) -> None:
+    """
+    Drop cached /query results for one knowledge base, or for all of them
+    when the knowledge base is unknown (e.g. deleting a document by id).
+    """
+    await delete_cache_keys(f"ragie:q:{knowledgeBase_id}:*" if knowledgeBase_id else "ragie:q:*")
+
+
+async def invalidate_listing_cache(organization_id: Optional[str] = None) -> None:
+    """
+    Drop the cached knowledge base and document listings for one organization,
+    or for all of them when the organization is unknown.
+    """
+    org = organization_id or "*"
+    await delete_cache_keys(kb_list_cache_key(org))
+    await delete_cache_keys(document_list_cache_key(org, "*"))
+
+
+async def get_cached_listing(key: str) -> Optional[Tuple[str, bytes]]:
+    """
+    Return the cached (etag, body) for a listing, or None on a miss or a
+    cache outage.
+    """
+    try:
+        etag, body = await app.state.redis.hmget(key, "etag", "body")
+    except redis.RedisError as e:
+        logger.warning("Listing cache lookup failed (%s): %s", key, e)
+        return None
+    if etag is None or body is None:
+        return None
+    return etag.decode(), body
+
+
+async def cache_listing(key: str, etag: str, body: bytes, ttl: int) -> None:
+    """
+    Store a listing's etag and encoded body together so a hit can answer
+    both conditional and full requests.
+    """
+    try:
+        async with app.state.redis.pipeline(transaction=True) as pipe:
+            await pipe.hset(key, mapping={"etag": etag, "body": body}).expire(key, ttl).execute()
+    except redis.RedisError as e:
+        logger.warning("Listing cache store failed (%s): %s", key, e)
+
+
+# --------------------------
+# Conditional Response Helpers
+# --------------------------
+def compute_etag(body: bytes) -> str:
+    """
+    Strong ETag for an encoded response body.
+    """
+    return f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def etag_response(request: Request, etag: str, body: bytes) -> Response:
+    """
+    Return 304 Not Modified when the client's If-None-Match already matches
+    the etag, otherwise the JSON body tagged with it.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
 # --------------------------
 # Pydantic Models for Request Bodies (for endpoints that use JSON)
 # --------------------------
 class QueryRequest(BaseModel):
-    knowledgeBase_id: str
+    knowledgeBase_id: str = Field(..., pattern=ID_PATTERN)
     query: str
 
 
@@ -98,8 +420,8 @@ class QueryRequest(BaseModel):
 
 @app.post("/ingest")
 async def ingest_document_endpoint(
-    organization_id: str = Form(...),
-    knowledgeBase_id: str = Form(...),
+    organization_id: str = Form(..., pattern=ID_PATTERN),
+    knowledgeBase_id: str = Form(..., pattern=ID_PATTERN),
     external_id: Optional[str] = Form(''),
     name: Optional[str] = Form(''),
     partition: Optional[str] = Form(''),
@@ -109,7 +431,7 @@ async def ingest_document_endpoint(
     Ingest a document into ragie.ai using the 'Create Document' endpoint.
     The file is uploaded along with additional metadata.
     """
-    url = f"{BASE_URL}/documents"
+    path = "/documents"
 
     # Create metadata dictionary with organization_id and knowledgeBase_id
     metadata_dict = {
@@ -120,7 +442,7 @@ async def ingest_document_endpoint(
     # Prepare form data
     data = {
         "mode": "fast",
-        "metadata": json.dumps(metadata_dict)  # Convert metadata dict to JSON string
+        "metadata": orjson.dumps(metadata_dict).decode()  # Convert metadata dict to JSON string
     }
     
     if external_id:
@@ -130,113 +452,168 @@ async def ingest_document_endpoint(
     if partition:
         data["partition"] = partition
 
-    # Prepare file data
-    files = {"file": (file.filename, file.file, file.content_type)}
+    # Stream the file and form data as multipart instead of buffering the upload
+    content, headers = encode_multipart_upload(data, file)
 
     # Use the get_api_response function to make the API call
-    result = get_api_response(url, method="POST", payload=data, file=files)
+    result = await get_api_response(app.state.client, path, method="POST", content=content, headers=headers)
+
+    # Cached answers for this knowledge base may no longer be complete,
+    # and the document may have created a new knowledge base
+    await invalidate_query_cache(knowledgeBase_id)
+    await invalidate_listing_cache(organization_id)
     return result
 
 
 @app.delete("/documents/{document_id}")
-def delete_document_endpoint(document_id: str):
+async def delete_document_endpoint(document_id: str):
     """
     Delete a document from a specified knowledge base.
     """
-    url = f"{BASE_URL}/documents/{document_id}"
-    result = get_api_response(url, method="DELETE")
+    path = f"/documents/{document_id}"
+    result = await get_api_response(app.state.client, path, method="DELETE")
+
+    # The document's knowledge base and organization aren't known here,
+    # so clear every cached query and listing
+    await invalidate_query_cache()
+    await invalidate_listing_cache()
     return result
 
 
 @app.post("/query")
-def query_knowledge_base_endpoint(request: QueryRequest):
+async def query_knowledge_base_endpoint(request: QueryRequest) -> Response:
     """
     Query a specific knowledge base to retrieve relevant document chunks.
+    Ragie's JSON body is passed through as-is rather than parsed and re-encoded.
     """
-    url = f"{BASE_URL}/retrievals"
-    payload = {
-        "filter": { "knowledgeBase_id": request.knowledgeBase_id },
-        "query": request.query,
-    }
-    result = get_api_response(url, method="POST", payload=payload)
-    return result
+    # Serve repeated queries from Redis; a cache outage just falls through to Ragie
+    key = query_cache_key(request.knowledgeBase_id, request.query)
+    try:
+        cached = await app.state.redis.get(key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
+    except redis.RedisError as e:
+        logger.warning("Query cache lookup failed: %s", e)
+
+    # Coalesce with an identical query that is already in flight; shield it so a
+    # waiter disconnecting doesn't cancel the shared result for everyone else
+    while (inflight := INFLIGHT_QUERIES.get(key)) is not None:
+        try:
+            body, status_code = await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            # Our own cancellation propagates; if only the leader was cancelled,
+            # loop round and fetch it ourselves as the new leader
+            if not inflight.cancelled() or asyncio.current_task().cancelling():
+                raise
+            continue
+        return Response(content=body, media_type="application/json", status_code=status_code)
+
+    future = asyncio.get_running_loop().create_future()
+    INFLIGHT_QUERIES[key] = future
+    try:
+        path = "/retrievals"
+        payload = {
+            "filter": { "knowledgeBase_id": request.knowledgeBase_id },
+            "query": request.query,
+        }
+        response = await fetch_api_response(app.state.client, path, method="POST", payload=payload)
+        body = response.content if response.content.strip() else b"{}"
+        future.set_result((body, response.status_code))
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        # Waiters re-raise the same error; mark it retrieved in case there are none
+        future.set_exception(e)
+        future.exception()
+        raise
+    finally:
+        if INFLIGHT_QUERIES.get(key) is future:
+            del INFLIGHT_QUERIES[key]
+
+    try:
+        await app.state.redis.set(key, body, ex=QUERY_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning("Query cache store failed: %s", e)
+    return Response(content=body, media_type="application/json", status_code=response.status_code)
 
 
 @app.get("/documents")
-def list_documents_endpoint(
-    organization_id: str = Query(..., description="Filter by organization_id"),
-    knowledgeBase_id: Optional[str] = Query(None, description="Filter by knowledgeBase_id")
-):
+async def list_documents_endpoint(
+    request: Request,
+    organization_id: str = Query(..., description="Filter by organization_id", pattern=ID_PATTERN),
+    knowledgeBase_id: Optional[str] = Query(None, description="Filter by knowledgeBase_id", pattern=ID_PATTERN)
+) -> Response:
     """
     List documents. Optionally filter by organization_id and/or knowledgeBase_id.
+    Responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
     """
-    url = f"{BASE_URL}/documents"
+    path = "/documents"
     
     # Extract string values from Query parameters
     org_id_str = str(organization_id)
     kb_id_str = str(knowledgeBase_id) if knowledgeBase_id is not None else None
+
+    # Serve repeat listings (and their ETag) from Redis without calling Ragie
+    key = document_list_cache_key(org_id_str, kb_id_str)
+    cached = await get_cached_listing(key)
+    if cached is not None:
+        return etag_response(request, *cached)
     
-    # Build the metadata filter
-    if kb_id_str:
-        # If both filters are present, use $and
-        filter_query = {
-            "$and": [
-                {"organization_id": {"$eq": org_id_str}},
-                {"knowledgeBase_id": {"$eq": kb_id_str}}
-            ]
-        }
-    else:
-        # If only organization_id is present, use simple filter
-        filter_query = {"organization_id": {"$eq": org_id_str}}
-    
-    # Add the filter to params if we have any
-    params = {"filter": json.dumps(filter_query)}
+    # Add the metadata filter to params
+    params = {"filter": build_metadata_filter(org_id_str, kb_id_str)}
     
     # Make the API call
-    response = get_api_response(url, params=params, method="GET")
+    response = await get_api_response(app.state.client, path, params=params, method="GET")
     
     # Extract documents from response
     documents = response.get("documents", []) if response else []
-    return documents
+
+    body = orjson.dumps(documents)
+    etag = compute_etag(body)
+    await cache_listing(key, etag, body, DOCUMENT_LIST_CACHE_TTL)
+    return etag_response(request, etag, body)
 
 
 @app.get("/knowledge-bases", response_model=List[Dict[str, Any]])
-def list_knowledge_bases_endpoint(organization_id: str = Query(..., description="Organization identifier")):
+async def list_knowledge_bases_endpoint(request: Request, organization_id: str = Query(..., description="Organization identifier", pattern=ID_PATTERN)) -> Response:
     """
     List knowledge bases for a given organization by grouping documents based on 'knowledgeBase_id'.
     Each knowledge base includes its title and creation time.
+    Responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
     """
     # Convert organization_id to string if it's not already
     org_id_str = str(organization_id)
+
+    # The grouped list is tiny compared to the documents it is built from,
+    # so serve repeat listings from Redis instead of refetching every document
+    key = kb_list_cache_key(org_id_str)
+    cached = await get_cached_listing(key)
+    if cached is not None:
+        return etag_response(request, *cached)
     
-    # Direct call to get_api_response instead of going through list_documents_endpoint
-    url = f"{BASE_URL}/documents"
-    
-    # Build the metadata filter
-    filter_query = {"organization_id": {"$eq": org_id_str}}
-    
-    # Add the filter to params
-    params = {"filter": json.dumps(filter_query)}
-    
-    # Make the API call directly
-    response = get_api_response(url, params=params, method="GET")
+    # Add the metadata filter to params
+    params = {"filter": build_metadata_filter(org_id_str)}
     
-    # Extract documents from response
-    documents = response.get("documents", []) if response else []
+    # Walk every page so knowledge bases beyond the first page aren't missed
+    documents = await list_all_documents(app.state.client, params)
     
+    # Single pass over the documents' metadata; the first document seen for a
+    # knowledge base supplies its title and creation time
     kb_dict = {}
-    
-    for doc in documents:
-        metadata = doc.get("metadata", {})
-        kb_id = metadata.get("knowledgeBase_id")  # Get knowledgeBase_id from metadata
-        if kb_id:
-            if kb_id not in kb_dict:
-                kb_dict[kb_id] = {
-                    "knowledgeBase_id": kb_id,
-                    "title": metadata.get("kb_title", "Unknown Title"),
-                    "creation_time": metadata.get("kb_creation_time", "Unknown Time")
-                }
-    return list(kb_dict.values())
+    for metadata in (doc.get("metadata") or {} for doc in documents):
+        kb_id = metadata.get("knowledgeBase_id")
+        if kb_id and kb_id not in kb_dict:
+            kb_dict[kb_id] = {
+                "knowledgeBase_id": kb_id,
+                "title": metadata.get("kb_title", "Unknown Title"),
+                "creation_time": metadata.get("kb_creation_time", "Unknown Time")
+            }
+
+    body = orjson.dumps(list(kb_dict.values()))
+    etag = compute_etag(body)
+    await cache_listing(key, etag, body, KB_LIST_CACHE_TTL)
+    return etag_response(request, etag, body)
 
 
 # --------------------------
@@ -244,4 +621,18 @@ def list_knowledge_bases_endpoint(organization_id: str = Query(..., description=
 # --------------------------
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    if os.getenv("ENV") == "dev":
+        # Single auto-reloading worker for local development
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    else:
+        # One worker per core on uvloop + httptools; each worker builds its own
+        # HTTP client and Redis pool in lifespan
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            loop="uvloop",
+            http="httptools",
+            workers=os.cpu_count(),
+            log_level="info"
+        )
\ No newline at end of file
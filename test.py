@@ -1,6 +1,9 @@
-import requests
+import asyncio
+import os
 import time
-import concurrent.futures
+from itertools import cycle, islice
+
+import httpx
 
 # Set your base URL (adjust the port and domain as needed)
 BASE_URL = "https://api.ragie.ai"
@@ -23,21 +26,31 @@ sample_queries = [
     "How can survivors manage long-term health concerns after lung cancer treatment?"
 ]
 
-def query_api(query: str):
+# Ragie API token, read from the environment rather than kept in source
+RAGIE_TOKEN = os.environ["RAGIE_TOKEN"]
+AUTH = f"Bearer {RAGIE_TOKEN}"
+
+# Upper bound on simultaneous connections; bursts larger than this queue on
+# the client's pool instead of opening a connection per request
+MAX_CONNECTIONS = 100
+
+# Headers sent with every query
+HEADERS = {
+    "accept": "application/json",
+    "authorization": AUTH
+}
+
+async def query_api(client: httpx.AsyncClient, query: str):
     """
     Send a query to the /query endpoint and measure the latency.
     """
-    headers = {
-        "accept": "application/json",
-        "authorization": f"Bearer tnt_IaYFVQkh7fq_ZiEfWDZE76FMAWw4AKooJ88kbjs9igKHlY1GiG63kUU"
-    }
     payload = {
         "filter": { "knowledgeBase_id": KNOWLEDGE_BASE_ID },
         "query": query,
     }
-    start_time = time.time()
-    response = requests.post(QUERY_ENDPOINT, json=payload, headers=headers)
-    end_time = time.time()
+    start_time = time.perf_counter()
+    response = await client.post(QUERY_ENDPOINT, json=payload)
+    end_time = time.perf_counter()
     latency = end_time - start_time
     return {
         "query": query,
@@ -45,39 +58,69 @@ def query_api(query: str):
         "status_code": response.status_code,
     }
 
-def sequential_query_test():
+def latency_summary(latencies: list) -> str:
+    """
+    Summarize a list of latencies (in seconds) as p50/p95/p99 and max.
+    """
+    if not latencies:
+        return "no successful requests"
+    latencies = sorted(latencies)
+    n = len(latencies)
+
+    def percentile(p: float) -> float:
+        return latencies[min(int(n * p), n - 1)]
+
+    return (f"n={n} p50={percentile(0.50):.3f}s p95={percentile(0.95):.3f}s "
+            f"p99={percentile(0.99):.3f}s max={latencies[-1]:.3f}s")
+
+async def sequential_query_test():
     """
     Test the query endpoint sequentially and print the latency for each request.
     """
     print("Starting sequential query tests...")
-    for query in sample_queries:
-        result = query_api(query)
-        print(f"Query: {result['query']}\n"
-              f"Latency: {result['latency']:.3f} seconds, "
-              f"Status: {result['status_code']}\n{'-'*40}")
+    latencies = []
+    async with httpx.AsyncClient(headers=HEADERS, timeout=30) as client:
+        for query in sample_queries:
+            result = await query_api(client, query)
+            latencies.append(result['latency'])
+            print(f"Query: {result['query']}\n"
+                  f"Latency: {result['latency']:.3f} seconds, "
+                  f"Status: {result['status_code']}\n{'-'*40}")
+    print(f"Latency: {latency_summary(latencies)}")
 
-def concurrent_query_test(concurrent_requests: int = 10):
+async def concurrent_query_test(concurrent_requests: int = 10):
     """
-    Test the query endpoint with multiple concurrent requests using ThreadPoolExecutor.
+    Test the query endpoint with multiple concurrent requests using asyncio.gather
+    and print a single latency/status summary once the burst has finished.
     """
     print(f"Starting concurrent query tests with {concurrent_requests} requests...")
     
-    # Create a list of queries by repeating sample queries if necessary.
-    queries = (sample_queries * ((concurrent_requests // len(sample_queries)) + 1))[:concurrent_requests]
+    # Create a list of queries by cycling through the sample queries as needed.
+    queries = list(islice(cycle(sample_queries), concurrent_requests))
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrent_requests) as executor:
-        futures = {executor.submit(query_api, query): query for query in queries}
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                result = future.result()
-                print(f"Query: {result['query']}\n"
-                      f"Latency: {result['latency']:.3f} seconds, "
-                      f"Status: {result['status_code']}\n{'-'*40}")
-            except Exception as exc:
-                print(f"Query generated an exception: {exc}")
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS)
+    async with httpx.AsyncClient(headers=HEADERS, timeout=30, limits=limits) as client:
+        # return_exceptions=True so one failed request doesn't cancel the rest
+        results = await asyncio.gather(
+            *[query_api(client, query) for query in queries],
+            return_exceptions=True
+        )
+    latencies = []
+    status_counts = {}
+    errors = []
+    for result in results:
+        if isinstance(result, Exception):
+            errors.append(result)
+            continue
+        latencies.append(result['latency'])
+        status_counts[result['status_code']] = status_counts.get(result['status_code'], 0) + 1
+
+    print(f"Latency: {latency_summary(latencies)} | Status: {status_counts} | Exceptions: {len(errors)}")
+    for exc in errors:
+        print(f"Query generated an exception: {exc}")
 
 if __name__ == '__main__':
     # Run sequential tests to measure individual response times.
-    # sequential_query_test()
+    # asyncio.run(sequential_query_test())
     # Run concurrent tests to evaluate the system's behavior under load.
-    concurrent_query_test(concurrent_requests=20)
+    asyncio.run(concurrent_query_test(concurrent_requests=20))
\ No newline at end of file